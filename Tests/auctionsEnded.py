@@ -1,12 +1,12 @@
 import requests
-import json
+import orjson
 import time
 
 def fetch(url):
     response = requests.get(url)
     try:
-        return response.json()
-    except requests.exceptions.JSONDecodeError:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError:
         print("Error: Received invalid JSON from", url)
         return {}
 
@@ -20,7 +20,7 @@ def main():
         if not data0:
             print("Data not yet available; retrying...")
             time.sleep(1)
-    with open('raw_auctions.json', 'w') as f:
-        json.dump(data0, f, indent=4)
+    with open('raw_auctions.json', 'wb') as f:
+        f.write(orjson.dumps(data0, option=orjson.OPT_INDENT_2))
 
 main()
\ No newline at end of file
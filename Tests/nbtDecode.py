@@ -0,0 +1,92 @@
+import io
+import sys
+import json
+import base64
+import importlib.util
+from pathlib import Path
+from nbt import nbt
+
+# Regression check: __main__.read_nbt_payload (via decode_item_bytes) must match nbt.nbt.NBTFile unpacking
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def load_main():
+    spec = importlib.util.spec_from_file_location('ah_main', ROOT / '__main__.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def reference_decode(b):
+    def unpack(tag):
+        if isinstance(tag, nbt.TAG_List):
+            return [unpack(t) for t in tag.tags]
+        if isinstance(tag, nbt.TAG_Compound):
+            return {t.name: unpack(t) for t in tag.tags}
+        return tag.value
+    return unpack(nbt.NBTFile(fileobj=io.BytesIO(base64.b64decode(b))))
+
+def same(a, b, path='root'):
+    """Strict structural equality (types included); returns the first differing path or None."""
+    if type(a) is not type(b):
+        return f"{path}: {type(a).__name__} != {type(b).__name__}"
+    if isinstance(a, dict):
+        if list(a) != list(b):
+            return f"{path}: keys {list(a)} != {list(b)}"
+        for k in a:
+            diff = same(a[k], b[k], f"{path}.{k}")
+            if diff:
+                return diff
+        return None
+    if isinstance(a, list):
+        if len(a) != len(b):
+            return f"{path}: len {len(a)} != {len(b)}"
+        for i, (x, y) in enumerate(zip(a, b)):
+            diff = same(x, y, f"{path}[{i}]")
+            if diff:
+                return diff
+        return None
+    return None if a == b else f"{path}: {a!r} != {b!r}"
+
+def synthetic_item():
+    """Item exercising every tag type, empty/nested lists and int/long/byte arrays."""
+    root = nbt.NBTFile()
+    root.name = ''
+    items = nbt.TAG_List(name='i', type=nbt.TAG_Compound)
+    item = nbt.TAG_Compound()
+    item.tags += [nbt.TAG_Short(name='id', value=267), nbt.TAG_Byte(name='Count', value=-1),
+                  nbt.TAG_Int(name='int', value=-2**31), nbt.TAG_Long(name='long', value=2**63 - 1),
+                  nbt.TAG_Float(name='float', value=0.5), nbt.TAG_Double(name='double', value=-1.25),
+                  nbt.TAG_String(name='str', value='§6Héroic ✦')]
+    byte_array = nbt.TAG_Byte_Array(name='bytes')
+    byte_array.value = bytearray(b'\x00\x7f\x80\xff')
+    int_array = nbt.TAG_Int_Array(name='ints')
+    int_array.value = [0, -1, 2**31 - 1]
+    long_array = nbt.TAG_Long_Array(name='longs')
+    long_array.value = [-2**63, 1]
+    item.tags += [byte_array, int_array, long_array, nbt.TAG_List(name='empty', type=nbt.TAG_String)]
+    nested = nbt.TAG_List(name='nested', type=nbt.TAG_List)
+    inner = nbt.TAG_List(type=nbt.TAG_Long)
+    inner.tags += [nbt.TAG_Long(value=v) for v in (3, -4)]
+    nested.tags += [inner, nbt.TAG_List(type=nbt.TAG_Byte)]
+    item.tags.append(nested)
+    items.tags.append(item)
+    root.tags.append(items)
+    buf = io.BytesIO()
+    root.write_file(fileobj=buf)
+    return base64.b64encode(buf.getvalue()).decode('ascii')
+
+def main():
+    ah_main = load_main()
+    with open(ROOT / 'auctions.json') as f:
+        samples = [x['item_bytes'] for x in json.load(f) if x.get('item_bytes')]
+    samples.append(synthetic_item())
+    failures = 0
+    for i, b in enumerate(samples):
+        diff = same(ah_main.decode_item_bytes(b, context={'sample': i}), reference_decode(b))
+        if diff:
+            failures += 1
+            print(f"Mismatch in sample {i}: {diff}")
+    print(f"Checked {len(samples)} item(s), {failures} mismatch(es).")
+    return 1 if failures else 0
+
+sys.exit(main())
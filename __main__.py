@@ -1,17 +1,42 @@
+import os
 import requests
-import nbt
-import io
+import gzip
+import struct
 import base64
 import json
+import orjson
 import sqlite3
 import time
-from nbt.nbt import TAG_List, TAG_Compound
-import aiohttp
-import asyncio
+import itertools
+import concurrent.futures
+import contextlib
+import re
+import ijson
 import traceback
 from datetime import datetime
 
+ENDED_AUCTIONS_URL = "https://api.hypixel.net/skyblock/auctions_ended"
+# (connect, per-read) seconds; the read timeout applies to every streamed chunk
+FETCH_TIMEOUT = (10, 60)
+# Shared keep-alive session for API requests
+SESSION = requests.Session()
 DECODE_ERROR_LOG = 'decode_errors.log'
+# Set DEBUG_DUMP=1 to write raw_auctions.json / auctions*.json intermediate snapshots
+DEBUG_DUMP = os.getenv('DEBUG_DUMP', '').strip().lower() in ('1', 'true', 'yes')
+# Minecraft formatting codes (section sign + one char), stripped from lore lines
+COLOR_CODE_RE = re.compile('§.')
+# Connection tuning for the price DBs: WAL + relaxed fsync, 256 MB mmap, 128 MB page cache
+SQLITE_PRAGMAS = "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA mmap_size=268435456; PRAGMA cache_size=-131072; PRAGMA temp_store=MEMORY;"
+# Rows per multi-row INSERT; 3 params each keeps us under SQLite's legacy 999 variable limit
+PRICE_INSERT_CHUNK = 300
+# OR IGNORE: the UNIQUE idx_prices_itemkey_ts_price index drops repeated (itemkey, timestamp, price) rows
+PRICE_INSERT_ONE = "INSERT OR IGNORE INTO prices (timestamp, itemkey, price) VALUES (?, ?, ?)"
+PRICE_INSERT_BULK = "INSERT OR IGNORE INTO prices (timestamp, itemkey, price) VALUES " + ','.join(['(?, ?, ?)'] * PRICE_INSERT_CHUNK)
+# Streamed auctions are decoded in batches of DECODE_BATCH, split into DECODE_CHUNKSIZE tasks per worker;
+# batches under DECODE_PARALLEL_MIN decode serially (pickling results back outweighs the split)
+DECODE_BATCH = 2048
+DECODE_CHUNKSIZE = 128
+DECODE_PARALLEL_MIN = 1024
 
 def log_decode_error(context, exc):
     """Append a JSON line describing a decode failure for later analysis."""
@@ -32,167 +57,290 @@ def log_decode_error(context, exc):
     except Exception as log_exc:
         print(f"Logging failure (ignored): {log_exc}")
 
+def insert_prices(cursor, rows):
+    """Insert (timestamp, itemkey, price) rows using multi-row VALUES statements.
+
+    Full chunks go through PRICE_INSERT_BULK; the leftover rows use the single-row
+    statement via executemany. Caller owns the transaction.
+    """
+    rows = list(rows)
+    cut = len(rows) - len(rows) % PRICE_INSERT_CHUNK
+    for start in range(0, cut, PRICE_INSERT_CHUNK):
+        cursor.execute(PRICE_INSERT_BULK, tuple(itertools.chain.from_iterable(rows[start:start + PRICE_INSERT_CHUNK])))
+    cursor.executemany(PRICE_INSERT_ONE, rows[cut:])
+
+# NBT tag ids with a fixed-size big-endian payload, plus the length prefixes
+NBT_SCALARS = {1: struct.Struct('>b'), 2: struct.Struct('>h'), 3: struct.Struct('>i'),
+               4: struct.Struct('>q'), 5: struct.Struct('>f'), 6: struct.Struct('>d')}
+NBT_INT_ARRAYS = {11: 'i', 12: 'q'}
+NBT_LEN = struct.Struct('>i')
+NBT_STR_LEN = struct.Struct('>H')
+
+def read_nbt_payload(buf, pos, tag_id):
+    """Decode the NBT payload of type tag_id starting at buf[pos]; returns (value, next_pos).
+
+    Builds plain dicts/lists directly (same shape as unpacking nbt.nbt tags via .value)
+    instead of materialising a tag object per node.
+    """
+    scalar = NBT_SCALARS.get(tag_id)
+    if scalar is not None:
+        return scalar.unpack_from(buf, pos)[0], pos + scalar.size
+    if tag_id == 8:
+        n = NBT_STR_LEN.unpack_from(buf, pos)[0]
+        pos += 2
+        return buf[pos:pos + n].decode('utf-8'), pos + n
+    if tag_id == 10:
+        out = {}
+        while True:
+            child = buf[pos]
+            if child == 0:
+                return out, pos + 1
+            n = NBT_STR_LEN.unpack_from(buf, pos + 1)[0]
+            pos += 3
+            name = buf[pos:pos + n].decode('utf-8')
+            out[name], pos = read_nbt_payload(buf, pos + n, child)
+    if tag_id == 9:
+        child = buf[pos]
+        n = NBT_LEN.unpack_from(buf, pos + 1)[0]
+        pos += 5
+        scalar = NBT_SCALARS.get(child)
+        if scalar is not None:
+            # Homogeneous numeric list: unpack every element in one call
+            return list(struct.unpack_from(f'>{n}{scalar.format[-1]}', buf, pos)), pos + n * scalar.size
+        out = []
+        for _ in range(n):
+            value, pos = read_nbt_payload(buf, pos, child)
+            out.append(value)
+        return out, pos
+    if tag_id == 7:
+        n = NBT_LEN.unpack_from(buf, pos)[0]
+        pos += 4
+        return bytearray(buf[pos:pos + n]), pos + n
+    if tag_id in NBT_INT_ARRAYS:
+        n = NBT_LEN.unpack_from(buf, pos)[0]
+        fmt = struct.Struct(f'>{n}{NBT_INT_ARRAYS[tag_id]}')
+        return list(fmt.unpack_from(buf, pos + 4)), pos + 4 + fmt.size
+    raise ValueError(f"Unknown NBT tag id {tag_id} at offset {pos}")
+
 def decode_item_bytes(b, context=None):
     """Decode base64 NBT item bytes into a Python structure; returns None if fails."""
     try:
-        raw = base64.b64decode(b)
-        nbt_file = nbt.nbt.NBTFile(fileobj=io.BytesIO(raw))
-        def unpack(tag):
-            if isinstance(tag, TAG_List):
-                return [unpack(t) for t in tag.tags]
-            if isinstance(tag, TAG_Compound):
-                return {t.name: unpack(t) for t in tag.tags}
-            return tag.value
-        return unpack(nbt_file)
+        raw = gzip.decompress(base64.b64decode(b))
+        if raw[0] != 10:
+            raise ValueError("First record is not a Compound Tag")
+        # Skip the root compound's type byte and (unused) name
+        return read_nbt_payload(raw, 3 + NBT_STR_LEN.unpack_from(raw, 1)[0], 10)[0]
     except Exception as e:
         ctx = context.copy() if isinstance(context, dict) else {'note': 'no context'}
         ctx['item_bytes'] = b[:120] + '...' if isinstance(b, str) and len(b) > 120 else b
         log_decode_error(ctx, e)
         return None
 
+def open_decode_pool():
+    """Process pool for decode_item_bytes, or a null context (serial decode) on single-CPU hosts."""
+    if (os.cpu_count() or 1) > 1:
+        return concurrent.futures.ProcessPoolExecutor()
+    return contextlib.nullcontext()
+
+def decode_context(x):
+    """Auction fields recorded alongside a decode failure."""
+    return {
+        'auction_id': x.get('auction_id') or x.get('uuid') or x.get('id'),
+        'price': x.get('price'),
+        'timestamp': x.get('timestamp'),
+    }
+
+def iter_decoded(auctions, pool=None):
+    """Yield (auction, full_nbt) for BIN auctions with a buyer; large batches are decoded across pool."""
+    auctions = (x for x in auctions if x.get('bin') and x.get('buyer'))
+    while True:
+        batch = list(itertools.islice(auctions, DECODE_BATCH))
+        if not batch:
+            return
+        item_bytes = [x.get('item_bytes') for x in batch]
+        contexts = [decode_context(x) for x in batch]
+        if pool is None or len(batch) < DECODE_PARALLEL_MIN:
+            nbts = map(decode_item_bytes, item_bytes, contexts)
+        else:
+            nbts = pool.map(decode_item_bytes, item_bytes, contexts, chunksize=DECODE_CHUNKSIZE)
+        yield from zip(batch, nbts)
+
+def build_record(x, detail, full_nbt):
+    """Flatten one decoded auction (detail = NBT i[0]) into the record used for keys and DB rows."""
+    ea = detail['tag']['ExtraAttributes']
+    display = detail['tag'].get('display', {})
+    return {
+        'timestamp': x['timestamp'],
+        'price': x['price'],
+        'unitprice': x['price'] / detail['Count'] if detail.get('Count') else None,
+        'count': detail.get('Count'),
+        'ench1': detail['tag'].get('ench'),
+        'ench2': ea.get('enchantments'),
+        'recomb': ea.get('rarity_upgrades'),
+        'color': str(display.get('color')) if display.get('color') is not None else None,
+        'attributes': ea.get('attributes'),
+        'gems': ({k: v['quality'] for k, v in ea.get('gems', {}).items() if k != 'unlocked_slots' and isinstance(v, dict)}
+                 if ea.get('gems') and any(k != 'unlocked_slots' and isinstance(v, dict) and 'quality' in v for k, v in ea.get('gems', {}).items()) else None),
+        'lore': [COLOR_CODE_RE.sub('', l) for l in display.get('Lore', [])],
+        'name': display.get('Name'),
+        'id': ea.get('id'),
+        'item_bytes': x.get('item_bytes'),
+        'full_nbt': full_nbt
+    }
+
+def compile_key_rules(options):
+    """Freeze the options used by build_key once per run (frozenset levels, tuple rarities/reforges)."""
+    return {
+        'relevant_enchants': {e: frozenset(levels) for e, levels in options.get('relevant_enchants', {}).items()},
+        'rarities': tuple(options.get('rarities') or ()),
+        'reforges': tuple(options.get('reforges') or ()),
+    }
+
+def match_rarities(lore, rarities):
+    """Configured rarities that appear as a whole lore line, in options order."""
+    if not lore:
+        return []
+    lines = set(lore)
+    return [r for r in rarities if r in lines]
+
+def build_key(a, rules):
+    """Composite price key: item id plus the enchants/rarities/reforges/modifiers that affect value.
+
+    Expects a['rarities'] to hold the match_rarities() result for the record.
+    """
+    parts = []
+    ench2 = a.get('ench2')
+    if ench2:
+        ench_part = ','.join([
+            f"{e}={v}" for e, allowed in rules['relevant_enchants'].items()
+            if (v := ench2.get(e)) is not None and v in allowed
+        ])
+        if ench_part:
+            parts.append(ench_part)
+    lore_rarities = a.get('rarities')
+    if lore_rarities:
+        parts.append(','.join(lore_rarities))
+    name = a.get('name')
+    reforges_present = [r for r in rules['reforges'] if r in name] if name else []
+    if reforges_present:
+        parts.append(','.join(reforges_present))
+    if a.get('recomb'):
+        parts.append('rarity_upgrade')
+    if a.get('color') is not None:
+        parts.append(f"color={a['color']}")
+    if a.get('attributes'):
+        attrs = ','.join([f"{k}={a['attributes'][k]}" for k in a['attributes']])
+        if attrs:
+            parts.append(attrs)
+    return a.get('id', 'UNKNOWN') + '.' + '+'.join(parts)
+
+def iter_ended_auctions(url=ENDED_AUCTIONS_URL):
+    """Yield auctions from the auctions_ended payload incrementally as the response streams in."""
+    with SESSION.get(url, stream=True, timeout=FETCH_TIMEOUT) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        try:
+            yield from ijson.items(response.raw, 'auctions.item', use_float=True)
+        except ijson.JSONError as e:
+            print("Error: Received invalid JSON", e)
+
 def main():
     print("Starting...")
     # 1. Load config
     with open('options.json') as f:
         options = json.load(f)
+    key_rules = compile_key_rules(options)
 
     def json_default(o):
         if isinstance(o, (bytes, bytearray)):
             return base64.b64encode(o).decode('ascii')
         return str(o)
 
-    # 2. Fetch auctions
-    print("Getting auctions...")
-    async def fetch_auctions():
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://api.hypixel.net/skyblock/auctions_ended") as response:
-                try:
-                    return await response.json()
-                except Exception as e:
-                    print("Error: Received invalid JSON", e)
-                    return {}
-    data0 = asyncio.run(fetch_auctions())
-    print("Got auctions!")
-    with open('raw_auctions.json', 'w') as f:
-        json.dump(data0, f, indent=4)
-    auctions = data0.get('auctions', [])
-    auctions = [x for x in auctions if x.get('bin') and x.get('buyer')]
+    if DEBUG_DUMP:
+        raw_auctions = []
+        decoded = []
 
-    # 3. Decode NBT
-    decoded = []
+    # 2-3. Stream auctions; decode NBT (process pool), extract detail.i[0], build records + keys in a single pass
+    print("Getting auctions...")
+    auctions = []
+    price_rows = []
     failures = 0
-    for x in auctions:
-        ctx = {
-            'auction_id': x.get('auction_id') or x.get('uuid') or x.get('id'),
-            'price': x.get('price'),
-            'timestamp': x.get('timestamp'),
-        }
-        detail = decode_item_bytes(x.get('item_bytes'), context=ctx)
-        if detail is None:
-            failures += 1
-            continue
-        decoded.append({**x, 'detail': detail, 'full_nbt': detail})
+    missing_detail = 0
+    stream = iter_ended_auctions()
+    if DEBUG_DUMP:
+        stream = (raw_auctions.append(x) or x for x in stream)
+    # Pool is scoped to this loop so workers are always shut down
+    with open_decode_pool() as pool:
+        for x, full_nbt in iter_decoded(stream, pool):
+            if full_nbt is None:
+                failures += 1
+                continue
+            if DEBUG_DUMP:
+                decoded.append({**x, 'detail': full_nbt, 'full_nbt': full_nbt})
+            try:
+                detail = full_nbt['i'][0]
+            except Exception as e:
+                missing_detail += 1
+                log_decode_error({'stage': 'extract_i0', 'auction_id': x.get('auction_id') or x.get('uuid'), 'reason': 'detail.i[0] missing'}, e)
+                continue
+            try:
+                rec = build_record(x, detail, full_nbt)
+            except Exception as e:
+                log_decode_error({'stage': 'process_record'}, e)
+                continue
+            rec['rarities'] = match_rarities(rec['lore'], key_rules['rarities'])
+            rec['key'] = build_key(rec, key_rules)
+            rec['base_key'] = rec.get('id')
+            auctions.append(rec)
+            price_rows.append((rec['timestamp'], rec['key'], rec['unitprice']))
+    print("Got auctions!")
     if failures:
         print(f"Warning: {failures} item(s) failed to decode (see {DECODE_ERROR_LOG}).")
-    auctions = decoded
-    try:
-        with open('auctions.json', 'w') as f:
-            json.dump(auctions, f, indent=4, default=json_default)
-    except Exception as e:
-        print("Error: Failed to write auctions.json: ", e)
-
-    # 4. Extract detail.i[0]
-    filtered = []
-    missing_detail = 0
-    for x in auctions:
-        try:
-            filtered.append({**x, 'detail': x['detail']['i'][0], 'full_nbt': x.get('full_nbt')})
-        except Exception as e:
-            missing_detail += 1
-            log_decode_error({'stage': 'extract_i0', 'auction_id': x.get('auction_id') or x.get('uuid'), 'reason': 'detail.i[0] missing'}, e)
     if missing_detail:
         print(f"Warning: {missing_detail} decoded item(s) lacked expected structure (logged).")
-    auctions = filtered
 
-    # 5. Build processed list
-    processed = []
-    for x in auctions:
+    # 4. Dump raw + processed JSON snapshots (debug only)
+    if DEBUG_DUMP:
+        with open('raw_auctions.json', 'wb') as f:
+            f.write(orjson.dumps({'auctions': raw_auctions}, option=orjson.OPT_INDENT_2))
         try:
-            detail = x['detail']
-            ea = detail['tag']['ExtraAttributes']
-            display = detail['tag'].get('display', {})
-            rec = {
-                'timestamp': x['timestamp'],
-                'price': x['price'],
-                'unitprice': x['price'] / detail['Count'] if detail.get('Count') else None,
-                'count': detail.get('Count'),
-                'ench1': detail['tag'].get('ench'),
-                'ench2': ea.get('enchantments'),
-                'recomb': ea.get('rarity_upgrades'),
-                'color': str(display.get('color')) if display.get('color') is not None else None,
-                'attributes': ea.get('attributes'),
-                'gems': ({k: v['quality'] for k, v in ea.get('gems', {}).items() if k != 'unlocked_slots' and isinstance(v, dict)}
-                         if ea.get('gems') and any(k != 'unlocked_slots' and isinstance(v, dict) and 'quality' in v for k, v in ea.get('gems', {}).items()) else None),
-                'lore': [l.replace('§.', '') for l in display.get('Lore', [])],
-                'name': display.get('Name'),
-                'id': ea.get('id'),
-                'item_bytes': x.get('item_bytes'),
-                'full_nbt': x.get('full_nbt')
-            }
-            processed.append(rec)
+            with open('auctions.json', 'wb') as f:
+                f.write(orjson.dumps(decoded, default=json_default, option=orjson.OPT_INDENT_2))
         except Exception as e:
-            log_decode_error({'stage': 'process_record'}, e)
-    auctions = processed
-
-    # 6. Create composite + base keys
-    for a in auctions:
-        parts = []
-        if a.get('ench2'):
-            ench_part = ','.join([
-                f"{e}={a['ench2'][e]}" for e in options.get('relevant_enchants', {})
-                if e in a['ench2'] and a['ench2'][e] in options['relevant_enchants'][e]
-            ])
-            if ench_part:
-                parts.append(ench_part)
-        lore_rarities = [r for r in options.get('rarities', []) if r in a.get('lore', [])]
-        if lore_rarities:
-            parts.append(','.join(lore_rarities))
-        reforges_present = [r for r in options.get('reforges', []) if a.get('name') and r in a['name']]
-        if reforges_present:
-            parts.append(','.join(reforges_present))
-        if a.get('recomb'):
-            parts.append('rarity_upgrade')
-        if a.get('color') is not None:
-            parts.append(f"color={a['color']}")
-        if a.get('attributes'):
-            attrs = ','.join([f"{k}={a['attributes'][k]}" for k in a['attributes']])
-            if attrs:
-                parts.append(attrs)
-        a['key'] = a.get('id', 'UNKNOWN') + '.' + '+'.join(parts)
-        a['base_key'] = a.get('id')
-
-    # 7. Dump processed JSON snapshots
-    try:
-        with open('auctions2.json', 'w') as f:
-            json.dump(auctions, f, indent=4, default=json_default)
-    except Exception as e:
-        print("Error: Failed to write auctions2.json", e)
-    auctions3 = [{k: x[k] for k in ('timestamp','key','unitprice')} for x in auctions]
-    with open('auctions3.json', 'w') as f:
-        json.dump(auctions3, f, indent=4, default=json_default)
+            print("Error: Failed to write auctions.json: ", e)
+        try:
+            with open('auctions2.json', 'wb') as f:
+                f.write(orjson.dumps(auctions, default=json_default, option=orjson.OPT_INDENT_2))
+        except Exception as e:
+            print("Error: Failed to write auctions2.json", e)
+        auctions3 = [dict(zip(('timestamp', 'key', 'unitprice'), row)) for row in price_rows]
+        with open('auctions3.json', 'wb') as f:
+            f.write(orjson.dumps(auctions3, default=json_default, option=orjson.OPT_INDENT_2))
 
-    # 8. Insert legacy DB
-    sql = "INSERT INTO prices (timestamp, itemkey, price) VALUES (?, ?, ?)"
+    # 5. Insert legacy DB
     conn = sqlite3.connect('database.db')
     cursor = conn.cursor()
+    cursor.executescript(SQLITE_PRAGMAS)
     cursor.execute("CREATE TABLE IF NOT EXISTS prices (timestamp INTEGER, itemkey TEXT, price REAL)")
-    for auction in auctions3:
-        cursor.execute(sql, (auction['timestamp'], auction['key'], auction['unitprice']))
-    conn.commit(); cursor.close(); conn.close()
+    # Unique covering index: per-itemkey GROUP BY / COUNT(DISTINCT timestamp) / AVG(price) never touch
+    # the table, and it is the only index the inserts have to maintain
+    if not any(row[1] == 'idx_prices_itemkey_ts_price' and row[2] for row in cursor.execute("PRAGMA index_list(prices)").fetchall()):
+        # Older DBs: drop duplicate rows and any non-unique version of the index first
+        cursor.execute("DELETE FROM prices WHERE rowid NOT IN (SELECT MIN(rowid) FROM prices GROUP BY itemkey, timestamp, price)")
+        cursor.execute("DROP INDEX IF EXISTS idx_prices_itemkey_ts_price")
+        cursor.execute("CREATE UNIQUE INDEX idx_prices_itemkey_ts_price ON prices(itemkey, timestamp, price)")
+        conn.commit()
+    # One explicit transaction for the whole batch instead of per-statement journaling
+    cursor.execute("BEGIN IMMEDIATE")
+    insert_prices(cursor, price_rows)
+    conn.commit()
+    cursor.execute("PRAGMA optimize")
+    cursor.close(); conn.close()
 
-    # 9. Insert new detailed DB
+    # 6. Insert new detailed DB
     conn2 = sqlite3.connect('database2.db')
     c2 = conn2.cursor()
+    c2.executescript(SQLITE_PRAGMAS)
     c2.execute("""
         CREATE TABLE IF NOT EXISTS pricesV2 (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -265,7 +413,8 @@ def main():
     c2.execute("CREATE INDEX IF NOT EXISTS idx_pricesV2_itemkey ON pricesV2(itemkey)")
     c2.execute("CREATE INDEX IF NOT EXISTS idx_pricesV2_timestamp ON pricesV2(timestamp)")
     for a in auctions:
-        full_nbt_json = json.dumps(a.get('full_nbt'), ensure_ascii=False)
+        # Stored JSON keeps json.dumps' ", "/": " separators so pricesV2 history stays in one format
+        full_nbt_json = json.dumps(a.get('full_nbt'), ensure_ascii=False, default=json_default)
         ench_json = json.dumps(a.get('ench2'), ensure_ascii=False) if a.get('ench2') else None
         c2.execute(
             "INSERT INTO pricesV2 (timestamp, itemkey, base_key, unitprice, count, recomb, color, name, raw_item_bytes, full_nbt_json, ench) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
@@ -290,21 +439,21 @@ def main():
                     c2.execute("INSERT INTO item_gems (price_id, gem, quality) VALUES (?, ?, ?)", (price_id, gem, quality))
                 except Exception as e:
                     log_decode_error({'stage': 'insert_gem', 'gem': gem, 'quality': quality, 'price_id': price_id}, e)
-        if a.get('lore'):
-            for r in (options.get('rarities') or []):
-                if r in a['lore']:
-                    try:
-                        c2.execute("INSERT INTO item_rarities (price_id, rarity) VALUES (?, ?)", (price_id, r))
-                    except Exception as e:
-                        log_decode_error({'stage': 'insert_rarity', 'rarity': r, 'price_id': price_id}, e)
-        if a.get('name') and options.get('reforges'):
-            for reforge in options['reforges']:
+        for r in a['rarities']:
+            try:
+                c2.execute("INSERT INTO item_rarities (price_id, rarity) VALUES (?, ?)", (price_id, r))
+            except Exception as e:
+                log_decode_error({'stage': 'insert_rarity', 'rarity': r, 'price_id': price_id}, e)
+        if a.get('name') and key_rules['reforges']:
+            for reforge in key_rules['reforges']:
                 if reforge in a['name']:
                     try:
                         c2.execute("INSERT INTO item_reforges (price_id, reforge) VALUES (?, ?)", (price_id, reforge))
                     except Exception as e:
                         log_decode_error({'stage': 'insert_reforge', 'reforge': reforge, 'price_id': price_id}, e)
-    conn2.commit(); c2.close(); conn2.close()
+    conn2.commit()
+    c2.execute("PRAGMA optimize")
+    c2.close(); conn2.close()
 
     print(f"Completed processing {len(auctions)} auctions (V2 records inserted).")
 
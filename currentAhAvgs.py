@@ -1,6 +1,7 @@
 import requests
 import sqlite3
 import json
+import orjson
 import concurrent.futures
 from itemKeyMaker import decode_item_bytes, create_item_key
 
@@ -27,7 +28,9 @@ def remove_outliers(prices):
     upper_bound = q3 + 1.5 * iqr
     return [p for p in prices if lower_bound <= p <= upper_bound]
 
-def update_averages_db_and_json(key, plain_item, average, volume):
+def update_averages_db_and_json(rows):
+    """Write (key, plain_item, average, volume) rows to currentAuctions.db and .json in one pass each."""
+    rows = list(rows)
     conn = sqlite3.connect('currentAuctions.db')
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS averages (
@@ -36,23 +39,38 @@ def update_averages_db_and_json(key, plain_item, average, volume):
                     average REAL,
                     volume INTEGER
                 )''')
-    c.execute('''INSERT OR REPLACE INTO averages (key, plain_item, average, volume) VALUES (?, ?, ?, ?)''',
-              (key, plain_item, average, volume))
+    c.executemany('''INSERT OR REPLACE INTO averages (key, plain_item, average, volume) VALUES (?, ?, ?, ?)''',
+                  rows)
     conn.commit()
     conn.close()
 
     try:
-        with open('currentAuctions.json', 'r') as jf:
-            averages_data = json.load(jf)
-    except (FileNotFoundError, json.JSONDecodeError):
+        with open('currentAuctions.json', 'rb') as jf:
+            averages_data = orjson.loads(jf.read())
+    except (FileNotFoundError, orjson.JSONDecodeError):
         averages_data = {}
-    averages_data[key] = {
-        "plain_item": plain_item,
-        "average": average,
-        "volume": volume
-    }
-    with open('currentAuctions.json', 'w') as jf:
-        json.dump(averages_data, jf, indent=4)
+    for key, plain_item, average, volume in rows:
+        averages_data[key] = {
+            "plain_item": plain_item,
+            "average": average,
+            "volume": volume
+        }
+    with open('currentAuctions.json', 'wb') as jf:
+        jf.write(orjson.dumps(averages_data, option=orjson.OPT_INDENT_2))
+
+def iter_averages(item_prices):
+    """Yield (key, plain_item, average, volume) per key after outlier removal, in key order."""
+    for key, data in sorted(item_prices.items()):
+        prices = data["prices"]
+        cleaned_prices = remove_outliers(prices)
+        if cleaned_prices:
+            average = sum(cleaned_prices) / len(cleaned_prices)
+            volume = len(cleaned_prices)
+            yield key, data["plain_item"], average, volume
+            # print(f"Updated {data['plain_item']} (key: {key}): average = {average:.2f} based on {volume} prices")
+        else:
+            # print(f"No valid prices for {data['plain_item']} (key: {key}) after removing outliers.")
+            pass
 
 def process_auctions(auctions, item_prices, options):
     for auction in auctions:
@@ -92,17 +110,7 @@ def main():
         if auctions:
             process_auctions(auctions, item_prices, options)
 
-    for key, data in sorted(item_prices.items()):
-        prices = data["prices"]
-        cleaned_prices = remove_outliers(prices)
-        if cleaned_prices:
-            average = sum(cleaned_prices) / len(cleaned_prices)
-            volume = len(cleaned_prices)
-            update_averages_db_and_json(key, data["plain_item"], average, volume)
-            # print(f"Updated {data['plain_item']} (key: {key}): average = {average:.2f} based on {volume} prices")
-        else:
-            # print(f"No valid prices for {data['plain_item']} (key: {key}) after removing outliers.")
-            pass
+    update_averages_db_and_json(iter_averages(item_prices))
 
 if __name__ == "__main__":
     main()
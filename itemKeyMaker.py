@@ -1,21 +1,49 @@
-import io
+import gzip
 import base64
 import json
-import nbt
-from nbt.nbt import TAG_List, TAG_Compound
+from nbt.nbt import TAG_List, TAG_Compound, NBTFile
 import pyperclip
 
 # WIP
 
+class ByteReader:
+    """Minimal read()-only file over an in-memory buffer, for NBTFile(buffer=...)."""
+    __slots__ = ('b', 'p')
+
+    def __init__(self, b):
+        self.b = b
+        self.p = 0
+
+    def read(self, n):
+        r = self.b[self.p:self.p + n]
+        self.p += n
+        return r
+
+    def close(self):
+        pass
+
+def unpack_nbt(tag):
+    # Exact-type dict dispatch; every other tag type is a leaf with a .value
+    unpack = NBT_CONTAINERS.get(type(tag))
+    return unpack(tag) if unpack else tag.value
+
+def unpack_list(tag):
+    return [unpack_nbt(i) for i in tag.tags]
+
+def unpack_compound(tag):
+    return {i.name: unpack_nbt(i) for i in tag.tags}
+
+NBT_CONTAINERS = {
+    TAG_List: unpack_list,
+    TAG_Compound: unpack_compound,
+    NBTFile: unpack_compound,
+}
+
 def decode_item_bytes(b):
-    nbt_file = nbt.nbt.NBTFile(fileobj=io.BytesIO(base64.b64decode(b)))
-    def unpack_nbt(tag):
-        if isinstance(tag, TAG_List):
-            return [unpack_nbt(i) for i in tag.tags]
-        elif isinstance(tag, TAG_Compound):
-            return {i.name: unpack_nbt(i) for i in tag.tags}
-        else:
-            return tag.value
+    # NOTE: __main__.py decodes the same format with its own struct-based read_nbt_payload;
+    # keep the two in sync (Tests/nbtDecode.py checks that one against NBTFile).
+    # Gunzip up front so NBTFile reads raw bytes instead of going through GzipFile/BytesIO
+    nbt_file = NBTFile(buffer=ByteReader(gzip.decompress(base64.b64decode(b))))
     return unpack_nbt(nbt_file)
 
 def create_item_key(raw_item):
@@ -8,6 +8,8 @@ large binary SQLite files are not stored directly in git history (avoids the
 APPENDS snapshots to existing .sql.gz files to maintain complete history.
 Each snapshot is prefixed with JSON metadata and terminated with blank lines.
 Format: [JSON metadata]\\n[SQL dump]\\n\\n
+Every snapshot is its own gzip member; the latest member's byte offset is
+kept in a sidecar <dump>.idx so restores only decompress that member.
 
 Restoration from latest snapshot:
   python3 -c "from scripts.prepare_db_snapshots import restore_latest; 
@@ -20,11 +22,16 @@ We do a LIGHT optimization (optional pruning hook, PRAGMA optimize, VACUUM).
 Add any domain‑specific row pruning inside prune_db() if desired.
 """
 from __future__ import annotations
-import gzip, os, sqlite3, subprocess, sys, json, time
+import contextlib, gzip, os, shutil, sqlite3, subprocess, sys, json, time
 from pathlib import Path
 
 ROOT = Path(__file__).resolve().parent.parent
 DB_FILES = ["database.db", "database2.db"]
+# pigz compresses blocks on all cores; fall back to single-threaded gzip when absent
+PIGZ = shutil.which("pigz")
+COMPRESS_LEVEL = 6
+# Read size when piping `sqlite3 .dump` output into the compressor
+DUMP_COPY_BUFSIZE = 1 << 20
 
 def human(size: int) -> str:
     units = ["B", "KB", "MB", "GB"]
@@ -42,6 +49,44 @@ def prune_db(db_path: Path) -> None:
     """
     pass
 
+@contextlib.contextmanager
+def open_gzip_append(dump_path: Path):
+    """Yield a binary sink whose writes become one new gzip member appended to dump_path.
+
+    Readers see all members as one concatenated stream.
+    """
+    if PIGZ:
+        with open(dump_path, "ab") as out:
+            with subprocess.Popen([PIGZ, "-c", f"-{COMPRESS_LEVEL}", "-n"], stdin=subprocess.PIPE, stdout=out) as proc:
+                yield proc.stdin
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args)
+        return
+    try:
+        gz = gzip.GzipFile(filename=str(dump_path), mode="ab", compresslevel=COMPRESS_LEVEL, mtime=0)
+    except TypeError:
+        # Fallback without mtime for older interpreters
+        gz = gzip.GzipFile(filename=str(dump_path), mode="ab", compresslevel=COMPRESS_LEVEL)
+    with gz:
+        yield gz
+
+def index_path(dump_path: Path) -> Path:
+    """Sidecar holding the byte offset of the latest snapshot member."""
+    return dump_path.with_name(dump_path.name + ".idx")
+
+def latest_snapshot_offset(gz_path: Path) -> int:
+    """Offset of the last indexed gzip member in gz_path, or 0 if unknown/invalid."""
+    idx = index_path(gz_path)
+    try:
+        # Older sidecars listed every offset; the last one is still the latest
+        offset = int(idx.read_text().split()[-1])
+    except (OSError, ValueError, IndexError):
+        return 0
+    with open(gz_path, "rb") as f:
+        f.seek(offset)
+        # Stale or foreign index: only trust offsets that land on a gzip header
+        return offset if f.read(2) == b"\x1f\x8b" else 0
+
 def optimize_and_dump(db_path: Path):
     """Optimize database and create/append SQL dump to .sql.gz file.
     
@@ -75,8 +120,6 @@ def optimize_and_dump(db_path: Path):
                 pass
         con.close()
         
-        # Get dump from sqlite3
-        dump_bytes = subprocess.check_output(["sqlite3", str(db_path), ".dump"], text=False)
         orig = db_path.stat().st_size
         
         # Create metadata header (JSON on single line for easy parsing)
@@ -88,21 +131,29 @@ def optimize_and_dump(db_path: Path):
         metadata_line = json.dumps(metadata, separators=(',', ':')) + '\n'
         metadata_bytes = metadata_line.encode('utf-8')
         
-        # Combine metadata + dump
-        combined_bytes = metadata_bytes + dump_bytes + b'\n\n'
-        
-        # Append to existing .sql.gz or create new
+        # Append metadata + dump to existing .sql.gz or create new, piping sqlite3
+        # straight into the compressor so the dump is never held in memory
+        before = dump_path.stat().st_size if dump_path.exists() else 0
         try:
-            with gzip.GzipFile(filename=str(dump_path), mode="ab", compresslevel=9, mtime=0) as gz:
-                gz.write(combined_bytes)
-        except TypeError:
-            # Fallback without mtime for older interpreters
-            with gzip.GzipFile(filename=str(dump_path), mode="ab", compresslevel=9) as gz:
-                gz.write(combined_bytes)
+            with subprocess.Popen(["sqlite3", str(db_path), ".dump"], stdout=subprocess.PIPE) as proc:
+                with open_gzip_append(dump_path) as gz:
+                    gz.write(metadata_bytes)
+                    shutil.copyfileobj(proc.stdout, gz, DUMP_COPY_BUFSIZE)
+                    gz.write(b'\n\n')
+            if proc.returncode:
+                raise subprocess.CalledProcessError(proc.returncode, proc.args)
+        except BaseException:
+            # Drop the partial member so earlier snapshots stay readable
+            if before:
+                os.truncate(dump_path, before)
+            else:
+                dump_path.unlink(missing_ok=True)
+            raise
+        index_path(dump_path).write_text(f"{before}\n")
         
         comp = dump_path.stat().st_size
-        ratio = (1 - comp / orig) * 100 if orig else 0
-        action = "Updated" if comp > len(combined_bytes) else "Created"
+        ratio = (1 - (comp - before) / orig) * 100 if orig else 0
+        action = "Updated" if before else "Created"
         print(f"{action} {dump_path.name}: {human(orig)} original -> {human(comp)} total (latest {ratio:.1f}% smaller)")
         return dump_path
     except subprocess.CalledProcessError as e:
@@ -125,23 +176,19 @@ def restore_latest(gz_path: str | Path, db_path: str | Path) -> bool:
         return False
     
     try:
-        with gzip.open(gz_path, 'rt') as f:
-            content = f.read()
-        
-        lines = content.split('\n')
-        
-        # Find all JSON metadata lines (they start with '{')
-        json_line_indices = []
-        for i, line in enumerate(lines):
-            if line.strip().startswith('{'):
-                json_line_indices.append(i)
+        # Decompress from the latest indexed member onwards (whole file without an index)
+        with open(gz_path, 'rb') as raw:
+            raw.seek(latest_snapshot_offset(gz_path))
+            with gzip.GzipFile(fileobj=raw) as f:
+                content = f.read().decode('utf-8')
         
-        if json_line_indices:
+        # Latest JSON metadata line is the last line starting with '{'
+        meta_start = content.rfind('\n{') + 1
+        if meta_start or content.startswith('{'):
             # File has appended snapshots with metadata
             # Extract SQL from the last snapshot (after the last JSON line)
-            last_json_idx = json_line_indices[-1]
-            sql_lines = lines[last_json_idx + 1:]
-            sql_dump = '\n'.join(sql_lines)
+            meta_end = content.find('\n', meta_start)
+            sql_dump = content[meta_end + 1:] if meta_end != -1 else ''
         else:
             # Plain SQL format (no metadata)
             sql_dump = content
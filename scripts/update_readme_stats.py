@@ -17,24 +17,31 @@ from datetime import datetime, timezone
 ROOT = Path(__file__).resolve().parent.parent
 README_PATH = ROOT / 'README.md'
 DUMPS = [ROOT / 'database.sql.gz', ROOT / 'database2.sql.gz']
+# Snapshot metadata lines (JSON object per snapshot) and CREATE TABLE/[UNIQUE] INDEX lacking IF NOT EXISTS
+META_LINE_RE = re.compile(rb'^[^\S\n]*\{[^\n]*(?:\n|$)', re.MULTILINE)
+BARE_CREATE_RE = re.compile(rb'CREATE (TABLE|INDEX|UNIQUE INDEX) (?!IF NOT EXISTS)')
+# Legacy inserts, replayed as OR IGNORE so rows repeated across snapshots are counted once
+PRICES_INSERT_RE = re.compile(rb'^INSERT INTO (?="?prices"?[ (])', re.MULTILINE)
+# Every CI run starts from an empty database.db, so overlapping auctions_ended windows only
+# meet here; create the legacy table + unique index up front so even old-schema snapshots dedupe
+PRICES_SCHEMA = """
+CREATE TABLE prices (timestamp INTEGER, itemkey TEXT, price REAL);
+CREATE UNIQUE INDEX idx_prices_itemkey_ts_price ON prices(itemkey, timestamp, price);
+"""
 
 def load_dump(dump: Path) -> sqlite3.Connection:
     sql_bytes = gzip.decompress(dump.read_bytes())
-    text = sql_bytes.decode('utf-8', errors='replace')
 
     # Strip all JSON metadata lines (merged dumps contain one per snapshot)
-    lines = text.split('\n')
-    sql_lines = [line for line in lines if not line.strip().startswith('{')]
+    sql_bytes = META_LINE_RE.sub(b'', sql_bytes)
 
-    # Normalize bare CREATE TABLE to IF NOT EXISTS so duplicate snapshots don't fail
-    normalized = []
-    for line in sql_lines:
-        if 'CREATE TABLE ' in line and 'IF NOT EXISTS' not in line:
-            line = line.replace('CREATE TABLE ', 'CREATE TABLE IF NOT EXISTS ', 1)
-        normalized.append(line)
-    sql_text = '\n'.join(normalized)
+    # Normalize bare CREATE TABLE / INDEX to IF NOT EXISTS so duplicate snapshots don't fail
+    sql_bytes = BARE_CREATE_RE.sub(rb'CREATE \1 IF NOT EXISTS ', sql_bytes)
+    sql_bytes = PRICES_INSERT_RE.sub(b'INSERT OR IGNORE INTO ', sql_bytes)
+    sql_text = sql_bytes.decode('utf-8', errors='replace')
 
     con = sqlite3.connect(':memory:')
+    con.executescript(PRICES_SCHEMA)
     con.executescript(sql_text)
     return con
 